@@ -59,7 +59,7 @@ app.layout = dmc.MantineProvider(
 
 @callback(
     Output("display", "children"),
-    Input(TransferList.ids.main("transferlist"), "value"),
+    Input(TransferList.ids.main("transferlist"), "data"),
 )
 def udpate_display(values):
     return dmc.SimpleGrid(
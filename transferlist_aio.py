@@ -1,12 +1,45 @@
-import json
 from functools import partial
 from typing import Literal
 
 import dash_mantine_components as dmc
-from dash import ALL, MATCH, Input, Output, State, callback, clientside_callback, ctx, no_update
+from dash import ALL, MATCH, Input, Output, State, clientside_callback, dcc, html
 from dash_iconify import DashIconify
 
 
+_CHECKBOX_STYLES = {
+    "labelWrapper": {"flex": 1},
+    "label": {"cursor": "pointer", "padding": "0.5rem 0"},
+    "body": {"alignItems": "center", "gap": "0.5rem"},
+}
+# Serialized Checkbox shared with the clientside callbacks, which fill in the id, label, value and checked props
+_CHECKBOX = {
+    "namespace": "dash_mantine_components",
+    "type": "Checkbox",
+    "props": {"checked": False, "px": "0.25rem", "styles": _CHECKBOX_STYLES},
+}
+_SEARCH_INPUT_STYLES = {
+    "root": {"flex": 1},
+    "input": {
+        "borderTop": "none",
+        "borderLeft": "none",
+        "borderRight": "none",
+    },
+}
+_BUTTON_STYLE = {
+    "height": 34,
+    "width": 34,
+    "display": "grid",
+    "placeContent": "center",
+    "boxSizing": "content-box",
+}
+# Same border as the surrounding Paper, whose root defines --paper-border-color for each color scheme
+_BUTTON_BORDER = "calc(0.0625rem * var(--mantine-scale)) solid var(--paper-border-color)"
+_ICONS = {
+    name: DashIconify(icon=name, height=12)
+    for name in ("uiw:d-arrow-left", "uiw:d-arrow-right", "uiw:left", "uiw:right")
+}
+
+
 def base_id(part: str, aio_id: str):
     return {"part": part, "aio_id": aio_id}
 
@@ -15,6 +48,10 @@ def side_id(part: str, aio_id: str, side: Literal["left", "right"]):
     return {"part": part, "aio_id": aio_id, "side": side}
 
 
+def item_id(part: str, aio_id: str, side: Literal["left", "right"], value: str):
+    return {"part": part, "aio_id": aio_id, "side": side, "value": value}
+
+
 class TransferList(dmc.SimpleGrid):
     """TransferList AIO component to get the DMC 0.12 working with 0.14
 
@@ -37,7 +74,10 @@ class TransferList(dmc.SimpleGrid):
         transfer = partial(side_id, "__trl-transfer-input")
         transfer_all = partial(side_id, "__trl-transfer-all-input")
         checklist = partial(side_id, "__trl-checklist-input")
+        checkbox = partial(item_id, "__trl-checkbox-input")
+        selection = partial(side_id, "__trl-selection")
         main = partial(base_id, "__trl-main")
+        metadata = partial(base_id, "__trl-metadata")
 
     def __init__(
         self,
@@ -105,15 +145,19 @@ class TransferList(dmc.SimpleGrid):
                     ],
                     gap="0.375rem",
                 ),
-                # This input holds the actual value as well as some metadata to pass to callbacks
-                dmc.JsonInput(
-                    id=self.ids.main(aio_id),
-                    style={"display": "none"},
-                    value=value,
-                    **{
-                        "data-placeholder": json.dumps(placeholder),
-                        "data-nothingfound": json.dumps(nothingFound),
-                        "data-transferallmatchingfilters": json.dumps(transferAllMatchingFilters),
+                # These stores hold the actual value, the selected values of each list and some metadata
+                dcc.Store(id=self.ids.main(aio_id), data=value),
+                dcc.Store(id=self.ids.selection(aio_id, "left"), data=[]),
+                dcc.Store(id=self.ids.selection(aio_id, "right"), data=[]),
+                dcc.Store(
+                    id=self.ids.metadata(aio_id),
+                    data={
+                        "placeholder": placeholder,
+                        "nothingFound": nothingFound,
+                        "transferAllMatchingFilters": transferAllMatchingFilters,
+                        "checkbox": _CHECKBOX,
+                        "checkboxPart": self.ids.checkbox("", "", "")["part"],
+                        "transferPart": self.ids.transfer("", "")["part"],
                     },
                 ),
             ],
@@ -123,21 +167,20 @@ class TransferList(dmc.SimpleGrid):
         )
 
     @classmethod
-    def checkbox(cls, value: dict):
-        """Checkbox for the checklist.
+    def checkbox(cls, aio_id: str, side: Literal["left", "right"], value: dict):
+        """Checkbox for the checklist, as a serialized component to skip the component constructor.
 
+        :param aio_id: id of the AIO component
+        :param side: list side
         :param value: value of the checkbox, dict with keys label and value
         """
-        return dmc.Checkbox(
-            label=value["label"],
-            value=value["value"],
-            px="0.25rem",
-            styles={
-                "labelWrapper": {"flex": 1},
-                "label": {"cursor": "pointer", "padding": "0.5rem 0"},
-                "body": {"alignItems": "center", "gap": "0.5rem"},
+        return _CHECKBOX | {
+            "props": _CHECKBOX["props"] | {
+                "id": cls.ids.checkbox(aio_id, side, value["value"]),
+                "label": value["label"],
+                "value": value["value"],
             },
-        )
+        }
 
     @classmethod
     def checklist(
@@ -159,9 +202,9 @@ class TransferList(dmc.SimpleGrid):
         if limit:
             value = value[:limit]
         return dmc.ScrollArea(
-            dmc.CheckboxGroup(
-                [cls.checkbox(val) for val in value],
-                py="0.25rem",
+            html.Div(
+                [cls.checkbox(aio_id, side, val) for val in value],
+                style={"paddingTop": "0.25rem", "paddingBottom": "0.25rem"},
                 id=cls.ids.checklist(aio_id, side),
             ),
             style={"height": list_height},
@@ -177,14 +220,7 @@ class TransferList(dmc.SimpleGrid):
         :param **kwargs: kwargs to pass to the TextInput
         """
         return dmc.TextInput(
-            styles={
-                "root": {"flex": 1},
-                "input": {
-                    "borderTop": "none",
-                    "borderLeft": "none",
-                    "borderRight": "none",
-                }
-            },
+            styles=_SEARCH_INPUT_STYLES,
             radius=0,
             id=cls.ids.search(aio_id, side),
             debounce=250,
@@ -199,19 +235,10 @@ class TransferList(dmc.SimpleGrid):
         :param side: list side
         """
         icon_side = "left" if side == "right" else "right"
-        return dmc.Paper(
-            dmc.UnstyledButton(
-                DashIconify(icon=f"uiw:d-arrow-{icon_side}", height=12),
-                style={"height": 34, "width": 34, "display": "grid", "placeContent": "center"},
-                id=cls.ids.transfer_all(aio_id, side)
-            ),
-            withBorder=True,
-            radius=0,
-            style={
-                "borderTop": "none",
-                "borderLeft": "none",
-                "borderRight": "none",
-            }
+        return dmc.UnstyledButton(
+            _ICONS[f"uiw:d-arrow-{icon_side}"],
+            style=_BUTTON_STYLE | {"borderBottom": _BUTTON_BORDER},
+            id=cls.ids.transfer_all(aio_id, side),
         )
 
     @classmethod
@@ -223,15 +250,9 @@ class TransferList(dmc.SimpleGrid):
         :param show_transfer_all: whether the transfer all button is visible (impacts border style)
         """
         icon_side = "left" if side == "right" else "right"
-        return dmc.Paper(
-            dmc.UnstyledButton(
-                DashIconify(icon=f"uiw:{icon_side}", height=12),
-                style={"height": 34, "width": 34, "display": "grid", "placeContent": "center"},
-                id=cls.ids.transfer(aio_id, side)
-            ),
-            withBorder=True,
-            radius=0,
-            style={"borderTop": "none"} | (
+        return dmc.UnstyledButton(
+            _ICONS[f"uiw:{icon_side}"],
+            style=_BUTTON_STYLE | {"border": _BUTTON_BORDER, "borderTop": "none"} | (
                 {"borderRight": "none"}
                 if not show_transfer_all and side == "right"
                 else {}
@@ -239,143 +260,191 @@ class TransferList(dmc.SimpleGrid):
                 {"borderLeft": "none"}
                 if not show_transfer_all and side == "left"
                 else {}
-            )
+            ),
+            id=cls.ids.transfer(aio_id, side),
         )
 
 
-@callback(
+# Filter the list on search
+clientside_callback(
+    """(search, values, metadata, selection, currentChildren) => {
+        const {nothingFound, placeholder, checkbox, checkboxPart} = metadata
+        const triggered = dash_clientside.callback_context.triggered_id
+        if (!triggered) {
+            throw dash_clientside.PreventUpdate
+        }
+
+        const value = triggered.side === "left" ? values[0] : values[1]
+        // The full list is already displayed when clearing the search, nothing to rebuild
+        if (!search && Array.isArray(currentChildren) && currentChildren.length === value.length) {
+            const valueSet = new Set(value.map(v => v.value))
+            if ((selection || []).every(s => valueSet.has(s))) {
+                throw dash_clientside.PreventUpdate
+            }
+        }
+        const searchLc = search ? search.toLowerCase() : ""
+        const filtered = searchLc ? value.filter(v => v.label.toLowerCase().includes(searchLc)) : value
+        const filteredValues = new Set(filtered.map(f => f.value))
+        const updatedSelection = (selection || []).filter(s => filteredValues.has(s))
+        const selected = new Set(updatedSelection)
+        const text = (children) => ({
+            namespace: "dash_mantine_components",
+            type: "Text",
+            props: {children, p: "0.5rem", c: "dimmed"},
+        })
+        let children = null
+        if (filtered.length) {
+            children = filtered.map(v => ({
+                ...checkbox,
+                props: {
+                    ...checkbox.props,
+                    id: {part: checkboxPart, aio_id: triggered.aio_id, side: triggered.side, value: v.value},
+                    label: v.label,
+                    value: v.value,
+                    checked: selected.has(v.value),
+                },
+            }))
+        } else if (search && nothingFound) {
+            children = text(nothingFound)
+        } else if (!search && placeholder) {
+            children = text(placeholder)
+        }
+        return [children, updatedSelection]
+    }""",
     Output(TransferList.ids.checklist(MATCH, MATCH), "children"),
-    Output(TransferList.ids.checklist(MATCH, MATCH), "value"),
+    Output(TransferList.ids.selection(MATCH, MATCH), "data"),
     Input(TransferList.ids.search(MATCH, MATCH), "value"),
-    State(TransferList.ids.main(MATCH), "value"),
-    State(TransferList.ids.main(MATCH), "data-nothingfound"),
-    State(TransferList.ids.main(MATCH), "data-placeholder"),
-    State(TransferList.ids.checklist(MATCH, MATCH), "value"),
+    State(TransferList.ids.main(MATCH), "data"),
+    State(TransferList.ids.metadata(MATCH), "data"),
+    State(TransferList.ids.selection(MATCH, MATCH), "data"),
+    State(TransferList.ids.checklist(MATCH, MATCH), "children"),
     prevent_initial_call=True,
 )
-def filter_checklist(
-    search: str,
-    values: list[list[dict]],
-    nothing_found: str,
-    placeholder: str,
-    selection: list[str],
-):
-    """Filter the list on search."""
-    if not ctx.triggered_id:
-        return no_update, no_update
-
-    value = values[0] if ctx.triggered_id["side"] == "left" else values[1]
-    filtered = [v for v in value if not search or search.lower() in v["label"].lower()]
-    children = None
-    filtered_values = [f["value"] for f in filtered]
-    updated_selection = [s for s in (selection or []) if s in filtered_values]
-    if filtered:
-        children = [TransferList.checkbox(val) for val in filtered]
-    elif search and nothing_found:
-        children = dmc.Text(json.loads(nothing_found), p="0.5rem", c="dimmed")
-    elif not search and placeholder:
-        children = dmc.Text(json.loads(placeholder), p="0.5rem", c="dimmed")
-    return children, updated_selection
-
-
-@callback(
-    Output(TransferList.ids.main(MATCH), "value"),
+
+
+# Transfer items from one list to the other
+clientside_callback(
+    """(trigger1, trigger2, selection, search, currentValue, metadata, checklistChildren) => {
+        const {placeholder, transferAllMatchingFilters, checkbox, checkboxPart, transferPart} = metadata
+        const triggered = dash_clientside.callback_context.triggered_id
+        if (!(triggered && (trigger1.some(Boolean) || trigger2.some(Boolean)))) {
+            throw dash_clientside.PreventUpdate
+        }
+
+        const idx = triggered.side === "left" ? 0 : 1
+        const other = 1 - idx
+        const srcList = currentValue[idx]
+        const kept = []
+        const moved = []
+        // Transfer selected items when clicking the transfer button
+        if (triggered.part === transferPart) {
+            const transferredSet = new Set(selection[idx])
+            for (const v of srcList) {
+                (transferredSet.has(v.value) ? moved : kept).push(v)
+            }
+        // Transfer all items when clicking the transfer all button
+        } else {
+            // Filter out items that don't match the search if transferAllMatchingFilters is set
+            const sideSearch = transferAllMatchingFilters && search[idx]
+            const searchLc = sideSearch ? sideSearch.toLowerCase() : ""
+            for (const v of srcList) {
+                (!searchLc || v.label.toLowerCase().includes(searchLc) ? moved : kept).push(v)
+            }
+        }
+
+        if (!moved.length) {
+            throw dash_clientside.PreventUpdate
+        }
+
+        // Update the value
+        const newValue = []
+        newValue[idx] = kept
+        newValue[other] = currentValue[other].concat(moved)
+
+        // Create the new checkboxes or placeholder texts
+        const placeholderText = {
+            namespace: "dash_mantine_components",
+            type: "Text",
+            props: {children: placeholder, p: "0.5rem", c: "dimmed"},
+        }
+        const sides = ["left", "right"]
+        const checkboxes = (values, i) => values.length
+            ? values.map(v => ({
+                ...checkbox,
+                props: {
+                    ...checkbox.props,
+                    id: {part: checkboxPart, aio_id: triggered.aio_id, side: sides[i], value: v.value},
+                    label: v.label,
+                    value: v.value,
+                },
+            }))
+            : placeholderText
+        // The selection is cleared on both lists, so reused checkboxes are unchecked
+        const uncheck = c => c.props.checked ? {...c, props: {...c.props, checked: false}} : c
+        const newChildren = []
+        // Drop the moved checkboxes from the source list when it displays every item, rebuild otherwise
+        const srcChildren = checklistChildren[idx]
+        if (kept.length && Array.isArray(srcChildren) && srcChildren.length === srcList.length) {
+            const movedValues = new Set(moved.map(v => v.value))
+            newChildren[idx] = srcChildren.filter(c => !movedValues.has(c.props.value)).map(uncheck)
+        } else {
+            newChildren[idx] = checkboxes(kept, idx)
+        }
+        // Append the moved checkboxes to the destination list when it displays every item, rebuild otherwise
+        const dstChildren = checklistChildren[other]
+        if (Array.isArray(dstChildren) && dstChildren.length === currentValue[other].length) {
+            newChildren[other] = dstChildren.map(uncheck).concat(checkboxes(moved, other))
+        } else {
+            newChildren[other] = checkboxes(newValue[other], other)
+        }
+
+        return [newValue, newChildren, [[], []], ["", ""]]
+    }""",
+    Output(TransferList.ids.main(MATCH), "data"),
     Output(TransferList.ids.checklist(MATCH, ALL), "children", allow_duplicate=True),
-    Output(TransferList.ids.checklist(MATCH, ALL), "value", allow_duplicate=True),
+    Output(TransferList.ids.selection(MATCH, ALL), "data", allow_duplicate=True),
     Output(TransferList.ids.search(MATCH, ALL), "value", allow_duplicate=True),
     Input(TransferList.ids.transfer(MATCH, ALL), "n_clicks"),
     Input(TransferList.ids.transfer_all(MATCH, ALL), "n_clicks"),
-    State(TransferList.ids.checklist(MATCH, ALL), "value"),
+    State(TransferList.ids.selection(MATCH, ALL), "data"),
     State(TransferList.ids.search(MATCH, ALL), "value"),
-    State(TransferList.ids.main(MATCH), "value"),
-    State(TransferList.ids.main(MATCH), "data-placeholder"),
-    State(TransferList.ids.main(MATCH), "data-transferallmatchingfilters"),
+    State(TransferList.ids.main(MATCH), "data"),
+    State(TransferList.ids.metadata(MATCH), "data"),
+    State(TransferList.ids.checklist(MATCH, ALL), "children"),
     prevent_initial_call=True,
 )
-def transfer_values(
-    trigger1: list[int],
-    trigger2: list[int],
-    selection: list[list[str]],
-    search: list[str],
-    current_value: list[list[dict]],
-    placeholder: str,
-    transfer_matching: str,
-):
-    """Transfer items from one list to the other."""
-    if not (ctx.triggered_id and (any(trigger1) or any(trigger2))):
-        return no_update, no_update, no_update, no_update
-
-    side = ctx.triggered_id["side"]
-    # Transfer selected items when clicking the transfer button
-    if ctx.triggered_id["part"] == TransferList.ids.transfer("", "")["part"]:
-        transferred = selection[0] if side == "left" else selection[1]
-    # Transfer all items when clicking the transfer all button
-    else:
-        # Filter out items that don't match the search if transfer_matching is set
-        if json.loads(transfer_matching):
-            search_ = search[0 if side == "left" else 1]
-            transferred = [
-                v["value"] for v in current_value[0 if side == "left" else 1]
-                if not search_ or search_.lower() in v["label"].lower()
-            ]
-        else:
-            transferred = [v["value"] for v in current_value[0 if side == "left" else 1]]
-
-    if not transferred:
-        return no_update, [no_update] * 2, [no_update] * 2, [no_update] * 2
-
-    # Update the value
-    if side == "left":
-        new_value = [
-            [v for v in current_value[0] if v["value"] not in transferred],
-            current_value[1] + [v for v in current_value[0] if v["value"] in transferred],
-        ]
-    else:
-        new_value = [
-            current_value[0] + [v for v in current_value[1] if v["value"] in transferred],
-            [v for v in current_value[1] if v["value"] not in transferred],
-        ]
-
-    # Create the new checkboxes or placeholder texts
-    placeholder = json.loads(placeholder)
-    new_children = [
-        [TransferList.checkbox(v) for v in new_value[0]]
-        if new_value[0]
-        else dmc.Text(placeholder, p="0.5rem", c="dimmed"),
-        [TransferList.checkbox(v) for v in new_value[1]]
-        if new_value[1]
-        else dmc.Text(placeholder, p="0.5rem", c="dimmed"),
-    ]
-
-    return new_value, new_children, [[]] * 2, [""] * 2
-
-
-# Gray out the transfer button when nothing is selected
+
+
+# Aggregate the checked checkboxes into the list selection
 clientside_callback(
-    """(selection, style) => {
-        return {
-            ...style,
-            color: !!selection.length ? null : "gray",
-            cursor: !!selection.length ? "pointer" : "default",
-        }
-    }""",
-    Output(TransferList.ids.transfer(MATCH, MATCH), "style"),
-    Input(TransferList.ids.checklist(MATCH, MATCH), "value"),
-    State(TransferList.ids.transfer(MATCH, MATCH), "style"),
+    """(checked, ids) => ids.filter((_, i) => checked[i]).map(id => id.value)""",
+    Output(TransferList.ids.selection(MATCH, MATCH), "data", allow_duplicate=True),
+    Input(TransferList.ids.checkbox(MATCH, MATCH, ALL), "checked"),
+    State(TransferList.ids.checkbox(MATCH, MATCH, ALL), "id"),
+    prevent_initial_call=True,
 )
 
 
-# Gray out the transfer all button when nothing can be transferred
+# Gray out the transfer buttons when nothing is selected and the transfer all buttons when nothing can be transferred
 clientside_callback(
-    """(filtered, style) => {
-        const disabled = !filtered || !filtered.length
-        return {
+    """(selection, children, transferStyles, transferAllStyles, transferAllIds) => {
+        const update = (style, enabled) => ({
             ...style,
-            color: !disabled ? null : "gray",
-            cursor: !disabled ? "pointer" : "default",
-        }
+            color: enabled ? null : "gray",
+            cursor: enabled ? "pointer" : "default",
+        })
+        const transfer = transferStyles.map((style, i) => update(style, !!(selection[i] && selection[i].length)))
+        const transferAll = transferAllStyles.map((style, i) => {
+            const filtered = children[transferAllIds[i].side === "left" ? 0 : 1]
+            return update(style, !!(filtered && filtered.length))
+        })
+        return [transfer, transferAll]
     }""",
-    Output(TransferList.ids.transfer_all(MATCH, MATCH), "style"),
-    Input(TransferList.ids.checklist(MATCH, MATCH), "children"),
-    State(TransferList.ids.transfer_all(MATCH, MATCH), "style"),
+    Output(TransferList.ids.transfer(MATCH, ALL), "style"),
+    Output(TransferList.ids.transfer_all(MATCH, ALL), "style"),
+    Input(TransferList.ids.selection(MATCH, ALL), "data"),
+    Input(TransferList.ids.checklist(MATCH, ALL), "children"),
+    State(TransferList.ids.transfer(MATCH, ALL), "style"),
+    State(TransferList.ids.transfer_all(MATCH, ALL), "style"),
+    State(TransferList.ids.transfer_all(MATCH, ALL), "id"),
 )